@@ -0,0 +1,123 @@
+import heapq
+import itertools
+import threading
+import time
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Lower values are admitted first
+PRIORITY_IN_PROGRESS = 0
+PRIORITY_NEW_CALL = 1
+
+SHED_RATE_LIMITED = 'rate_limited'
+SHED_QUEUE_TIMEOUT = 'queue_timeout'
+SHED_QUEUE_FULL = 'queue_full'
+
+
+class AdmissionController:
+    """Concurrency limit, queue deadline and per-caller rate limit for voice webhooks.
+
+    At most max_concurrent requests run at once. Waiting requests are
+    admitted in priority order, so turns of calls already in progress go
+    ahead of new calls, and reserved_for_in_progress slots are never given
+    to new calls. A request that cannot start within queue_timeout seconds,
+    or whose caller exceeds caller_rate per second (with caller_burst
+    headroom), is shed so the route can answer immediately.
+    """
+
+    def __init__(self, max_concurrent=8, queue_timeout=2.0, max_queue=64,
+                 reserved_for_in_progress=2, caller_rate=1.0, caller_burst=5):
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be at least 1")
+        if not 0 <= reserved_for_in_progress < max_concurrent:
+            raise ValueError("reserved_for_in_progress must be between 0 and max_concurrent - 1")
+
+        self.max_concurrent = max_concurrent
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self.reserved_for_in_progress = reserved_for_in_progress
+        self.caller_rate = caller_rate
+        self.caller_burst = caller_burst
+
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._buckets = {}
+        self._buckets_lock = threading.Lock()
+        self.stats = {'admitted': 0, SHED_RATE_LIMITED: 0, SHED_QUEUE_TIMEOUT: 0, SHED_QUEUE_FULL: 0}
+
+    def acquire(self, caller_id=None, in_progress=False):
+        """Wait for a slot. Returns (True, None) when admitted or (False, reason) when shed."""
+        if caller_id and not self._take_token(caller_id):
+            return self._shed(SHED_RATE_LIMITED, caller_id)
+
+        priority = PRIORITY_IN_PROGRESS if in_progress else PRIORITY_NEW_CALL
+        deadline = time.monotonic() + self.queue_timeout
+
+        with self._condition:
+            if len(self._waiters) >= self.max_queue:
+                return self._shed(SHED_QUEUE_FULL, caller_id)
+
+            entry = (priority, next(self._sequence))
+            heapq.heappush(self._waiters, entry)
+            try:
+                while not (self._waiters[0] == entry and self._in_flight < self._limit(priority)):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return self._shed(SHED_QUEUE_TIMEOUT, caller_id)
+                    self._condition.wait(remaining)
+
+                self._in_flight += 1
+                self.stats['admitted'] += 1
+                return True, None
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                # The new head of the queue may be able to run now
+                self._condition.notify_all()
+
+    def release(self):
+        """Free a slot taken by acquire"""
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def snapshot(self):
+        """Current load and counters, for logging and health checks"""
+        with self._condition:
+            return dict(self.stats, in_flight=self._in_flight, queued=len(self._waiters))
+
+    def _limit(self, priority):
+        if priority == PRIORITY_IN_PROGRESS:
+            return self.max_concurrent
+        return self.max_concurrent - self.reserved_for_in_progress
+
+    def _shed(self, reason, caller_id):
+        with self._condition:
+            self.stats[reason] += 1
+        logger.warning(f"Shedding voice webhook for {caller_id or 'unknown caller'}: {reason}")
+        return False, reason
+
+    def _take_token(self, caller_id):
+        """Token bucket per caller"""
+        if not self.caller_rate:
+            return True
+
+        now = time.monotonic()
+        with self._buckets_lock:
+            tokens, updated = self._buckets.get(caller_id, (self.caller_burst, now))
+            tokens = min(self.caller_burst, tokens + (now - updated) * self.caller_rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[caller_id] = (tokens, now)
+
+            if len(self._buckets) > 10000:
+                # Forget callers whose bucket has refilled completely
+                refill_time = self.caller_burst / self.caller_rate
+                self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < refill_time}
+            return allowed
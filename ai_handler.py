@@ -1,6 +1,7 @@
 import os
 from openai import OpenAI
 import logging
+import traceback
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
@@ -45,8 +46,13 @@ Remember:
 
 Keep responses natural and conversational while maintaining medical professionalism."""
     
-    def process_speech(self, call_sid, speech_text):
-        """Process speech and generate response"""
+    def process_speech(self, call_sid, speech_text, raise_errors=False):
+        """Process speech and generate response.
+
+        On an OpenAI error the caller's message is taken back out of the
+        conversation, so a retry doesn't add it twice. With raise_errors the
+        error is re-raised instead of returning an apology.
+        """
         try:
             print("="*50)
             print("🤖 AI HANDLER: Processing Speech")
@@ -96,14 +102,21 @@ Keep responses natural and conversational while maintaining medical professional
                 print("❌ Error calling OpenAI API:")
                 print(f"💥 Error type: {type(openai_error).__name__}")
                 print(f"💥 Error message: {str(openai_error)}")
-                print(f"💥 Error details:", exc_info=True)
+                print(traceback.format_exc())
+                
+                # Drop the unanswered user message
+                self.conversations[call_sid].pop()
+                if raise_errors:
+                    raise
                 return "I apologize, but I'm having trouble processing your request. Could you please try again?"
             
         except Exception as e:
+            if raise_errors:
+                raise
             print("❌ Error in speech processing:")
             print(f"💥 Error type: {type(e).__name__}")
             print(f"💥 Error message: {str(e)}")
-            print(f"💥 Error details:", exc_info=True)
+            print(traceback.format_exc())
             return "I apologize, but I'm having trouble understanding. Could you please rephrase that?"
     
     def get_conversation_history(self, call_sid):
@@ -1,13 +1,20 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import os
+import time
 from datetime import datetime
+from urllib.parse import urlencode
+from xml.sax.saxutils import escape
 from dotenv import load_dotenv
 import logging
+import traceback
 from twilio.twiml.voice_response import VoiceResponse, Gather
 from call_service import CallService
 from phone_handler import handle_incoming_call, handle_speech, handle_recording_complete, get_call_transcript, clear_call_data, generate_response
 from ai_handler import AIHandler
+from webhook_dedup import TurnDeduplicator
+from call_analytics import CallAnalyticsWorker
+from admission_control import AdmissionController
 
 # Set up logging
 logging.basicConfig(
@@ -26,10 +33,33 @@ CORS(app, resources={r"/*": {"origins": "*"}})
 # Initialize services
 call_service = CallService()
 ai_handler = AIHandler()
+turn_deduplicator = TurnDeduplicator(
+    ttl_seconds=float(os.getenv('TURN_DEDUP_TTL_SECONDS', '30')),
+    # Stay under Twilio's 15 second webhook timeout
+    wait_timeout=float(os.getenv('TURN_DEDUP_WAIT_TIMEOUT', '10'))
+)
+call_analytics = CallAnalyticsWorker(
+    ai_handler.client,
+    batch_size=int(os.getenv('ANALYTICS_BATCH_SIZE', '5')),
+    flush_interval=float(os.getenv('ANALYTICS_FLUSH_INTERVAL', '10')),
+    concurrency=int(os.getenv('ANALYTICS_CONCURRENCY', '1')),
+    max_results=int(os.getenv('ANALYTICS_MAX_RESULTS', '1000'))
+)
+call_analytics.start()
+admission_controller = AdmissionController(
+    max_concurrent=int(os.getenv('ADMISSION_MAX_CONCURRENT', '8')),
+    queue_timeout=float(os.getenv('ADMISSION_QUEUE_TIMEOUT', '2')),
+    max_queue=int(os.getenv('ADMISSION_MAX_QUEUE', '64')),
+    reserved_for_in_progress=int(os.getenv('ADMISSION_RESERVED_FOR_IN_PROGRESS', '2')),
+    caller_rate=float(os.getenv('ADMISSION_CALLER_RATE', '1')),
+    caller_burst=int(os.getenv('ADMISSION_CALLER_BURST', '5'))
+)
+ADMISSION_MAX_RETRIES = int(os.getenv('ADMISSION_MAX_RETRIES', '3'))
 
 # In-memory storage
 active_calls = []
 incoming_calls = []
+pending_utterances = {}
 
 @app.route('/healthcheck', methods=['GET'])
 def healthcheck():
@@ -37,9 +67,157 @@ def healthcheck():
     logger.info("Health check endpoint hit")
     return jsonify({
         'status': 'success',
-        'message': 'Server is running'
+        'message': 'Server is running',
+        'admission': admission_controller.snapshot()
     })
 
+def get_int_value(name, default=0):
+    """Read an integer request value, falling back to default when it is missing or malformed"""
+    try:
+        return int(request.values.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+def process_speech_turn(call_sid, speech_result, turn=0):
+    """Run one speech turn through the AI and build the TwiML response.
+
+    Returns (twiml, ok); ok is False when the AI failed and the caller got
+    the error recovery response.
+    """
+    response = VoiceResponse()
+    
+    # Number the next Gather so its retries can be told apart from a repeated answer
+    speech_url = f"{os.getenv('NGROK_URL')}/?Turn={turn + 1}"
+    
+    try:
+        if speech_result:
+            print("🤖 Processing speech with AI")
+            # Process with AI
+            ai_response = ai_handler.process_speech(call_sid, speech_result, raise_errors=True)
+            print(f"🤖 AI Response: {ai_response}")
+            
+            # Say the AI response
+            response.say(ai_response, voice='alice')
+            print("🔊 Added AI response to TwiML")
+        else:
+            print("⚠️ No speech result received")
+            response.say("I apologize, but I didn't catch that. Could you please repeat what you said?", voice='alice')
+        
+        print(f"🌐 Using webhook URL: {speech_url}")
+        
+        # Add new gather
+        gather = Gather(
+            input='speech',
+            action=speech_url,
+            method='POST',
+            language='en-US',
+            speechTimeout='auto',
+            enhanced=True
+        )
+        response.append(gather)
+        print("🎤 Added gather for next speech input")
+        
+        # Add redirect for no input
+        response.redirect(speech_url, method='POST')
+        print("↩️ Added redirect for no input")
+        
+        response_str = str(response)
+        print("📤 Final TwiML response:")
+        print(response_str)
+        print("="*50)
+        return response_str, True
+        
+    except Exception as e:
+        print("❌ Error in speech processing:")
+        print(f"💥 Error type: {type(e).__name__}")
+        print(f"💥 Error message: {str(e)}")
+        print(traceback.format_exc())
+        
+        response = VoiceResponse()
+        response.say("I apologize for the difficulty. Let me know how I can help you.", voice='alice')
+        
+        print(f"🌐 Using webhook URL for error recovery: {speech_url}")
+        
+        # Add new gather even after error
+        gather = Gather(
+            input='speech',
+            action=speech_url,
+            method='POST',
+            language='en-US',
+            speechTimeout='auto',
+            enhanced=True
+        )
+        response.append(gather)
+        print("🎤 Added gather for retry")
+        
+        # Add redirect for no input
+        response.redirect(speech_url, method='POST')
+        print("↩️ Added redirect for no input")
+        
+        response_str = str(response)
+        print("📤 Error recovery TwiML response:")
+        print(response_str)
+        print("="*50)
+        return response_str, False
+
+HOLD_QUERY_PLACEHOLDER = '__hold_query__'
+
+def build_hold_twiml(final=False):
+    """Build the TwiML played to a shed request: a short hold, then a redirect back to retry"""
+    response = VoiceResponse()
+    
+    if final:
+        response.say("I'm sorry, we're receiving an unusually high number of calls. Please try calling back in a few minutes.", voice='alice')
+        response.hangup()
+        return str(response)
+    
+    response.say("Please hold for just a moment.", voice='alice')
+    response.pause(length=2)
+    response.redirect(f"{os.getenv('NGROK_URL')}/?{HOLD_QUERY_PLACEHOLDER}", method='POST')
+    return str(response)
+
+# Shed responses are built once up front; only the redirect query is filled in per request
+HOLD_TWIML = build_hold_twiml()
+BUSY_TWIML = build_hold_twiml(final=True)
+
+def sweep_pending_utterances():
+    """Drop held utterances whose hold redirect never came back"""
+    cutoff = time.monotonic() - turn_deduplicator.ttl_seconds
+    for call_sid, (_, _, stored_at) in list(pending_utterances.items()):
+        if stored_at < cutoff:
+            pending_utterances.pop(call_sid, None)
+
+def shed_response(call_sid, speech_result, turn, retry, in_progress):
+    """TwiML for a request turned away by the admission controller"""
+    if retry > ADMISSION_MAX_RETRIES:
+        pending_utterances.pop(call_sid, None)
+        return BUSY_TWIML
+    
+    if speech_result:
+        # Keep the utterance here rather than in the redirect URL, which ends up in logs
+        sweep_pending_utterances()
+        pending_utterances[call_sid] = (turn, speech_result, time.monotonic())
+    
+    query = urlencode({
+        'Turn': turn,
+        'AdmissionRetry': retry,
+        # Keep the original class so a shed new call can't come back as in progress
+        'AdmissionPriority': 'in-progress' if in_progress else 'new'
+    })
+    return HOLD_TWIML.replace(HOLD_QUERY_PLACEHOLDER, escape(query))
+
+def run_admitted_turn(call_sid, caller_id, speech_result, turn, retry, in_progress):
+    """Run a speech turn inside an admission slot, or return the hold TwiML if it is shed"""
+    admitted, reason = admission_controller.acquire(caller_id=caller_id, in_progress=in_progress)
+    if not admitted:
+        print(f"🚦 Request shed ({reason}), asking caller to hold")
+        return shed_response(call_sid, speech_result, turn, retry + 1, in_progress), False
+    
+    try:
+        return process_speech_turn(call_sid, speech_result, turn)
+    finally:
+        admission_controller.release()
+
 @app.route('/', methods=['GET', 'POST'])
 def root():
     """Root endpoint for speech processing"""
@@ -60,7 +238,6 @@ def root():
         
         # Handle POST request (speech webhook)
         print("🎤 Starting speech processing")
-        response = VoiceResponse()
         
         # Get speech result
         speech_result = request.values.get('SpeechResult')
@@ -69,85 +246,46 @@ def root():
         print(f"📞 Call SID: {call_sid}")
         print(f"🗣️ Speech Result: {speech_result}")
         
-        try:
-            if speech_result:
-                print("🤖 Processing speech with AI")
-                # Process with AI
-                ai_response = ai_handler.process_speech(call_sid, speech_result)
-                print(f"🤖 AI Response: {ai_response}")
-                
-                # Say the AI response
-                response.say(ai_response, voice='alice')
-                print("🔊 Added AI response to TwiML")
-            else:
-                print("⚠️ No speech result received")
-                response.say("I apologize, but I didn't catch that. Could you please repeat what you said?", voice='alice')
-            
-            # Create absolute URLs for webhooks
-            speech_url = f"{os.getenv('NGROK_URL')}/"
-            print(f"🌐 Using webhook URL: {speech_url}")
-            
-            # Add new gather
-            gather = Gather(
-                input='speech',
-                action=speech_url,
-                method='POST',
-                language='en-US',
-                speechTimeout='auto',
-                enhanced=True
-            )
-            response.append(gather)
-            print("🎤 Added gather for next speech input")
-            
-            # Add redirect for no input
-            response.redirect(speech_url, method='POST')
-            print("↩️ Added redirect for no input")
-            
-            response_str = str(response)
-            print("📤 Final TwiML response:")
-            print(response_str)
-            print("="*50)
-            return response_str
-            
-        except Exception as e:
-            print("❌ Error in speech processing:")
-            print(f"💥 Error type: {type(e).__name__}")
-            print(f"💥 Error message: {str(e)}")
-            print(f"💥 Error details:", exc_info=True)
-            
-            response.say("I apologize for the difficulty. Let me know how I can help you.", voice='alice')
-            
-            # Create absolute URLs for webhooks
-            speech_url = f"{os.getenv('NGROK_URL')}/"
-            print(f"🌐 Using webhook URL for error recovery: {speech_url}")
-            
-            # Add new gather even after error
-            gather = Gather(
-                input='speech',
-                action=speech_url,
-                method='POST',
-                language='en-US',
-                speechTimeout='auto',
-                enhanced=True
-            )
-            response.append(gather)
-            print("🎤 Added gather for retry")
-            
-            # Add redirect for no input
-            response.redirect(speech_url, method='POST')
-            print("↩️ Added redirect for no input")
-            
-            response_str = str(response)
-            print("📤 Error recovery TwiML response:")
-            print(response_str)
-            print("="*50)
+        turn = get_int_value('Turn')
+        
+        # A shed speech turn comes back through the hold redirect without its SpeechResult
+        retry = get_int_value('AdmissionRetry')
+        if retry and not speech_result:
+            pending_turn, pending_speech, _ = pending_utterances.pop(call_sid, (None, None, None))
+            if pending_turn == turn:
+                speech_result = pending_speech
+        
+        # Admission control: answer right away with a hold instead of queueing indefinitely
+        priority = request.values.get('AdmissionPriority')
+        if priority in ('new', 'in-progress'):
+            in_progress = priority == 'in-progress'
+        else:
+            in_progress = bool(speech_result) or call_sid in ai_handler.conversations
+        caller_id = request.values.get('From') or call_sid
+        
+        def admitted_turn():
+            return run_admitted_turn(call_sid, caller_id, speech_result, turn, retry, in_progress)
+        
+        if not speech_result:
+            response_str, _ = admitted_turn()
             return response_str
+        
+        # Retried or redirected webhooks for the same Gather reuse the first result.
+        # Only the first request of a turn takes an admission slot; duplicates just wait on it.
+        turn_key = turn_deduplicator.make_key(speech_result, turn)
+        return turn_deduplicator.run(
+            call_sid,
+            turn_key,
+            admitted_turn,
+            # If the turn this request duplicates is stuck, put the caller on hold instead of blocking
+            on_timeout=lambda: shed_response(call_sid, speech_result, turn, retry + 1, in_progress)
+        )
             
     except Exception as e:
         print("💥 CRITICAL ERROR in root endpoint:")
         print(f"💥 Error type: {type(e).__name__}")
         print(f"💥 Error message: {str(e)}")
-        print(f"💥 Error details:", exc_info=True)
+        print(traceback.format_exc())
         
         response = VoiceResponse()
         response.say("I apologize, but we're experiencing technical difficulties. Please try calling back in a few minutes.", voice='alice')
@@ -167,6 +305,18 @@ def status():
         logger.info(f"Request method: {request.method}")
         logger.info(f"Request headers: {dict(request.headers)}")
         logger.info(f"Request values: {dict(request.values)}")
+        
+        if request.values.get('CallStatus') == 'completed':
+            call_sid = request.values.get('CallSid')
+            turn_deduplicator.forget(call_sid)
+            pending_utterances.pop(call_sid, None)
+            
+            # Summaries and classification run on the analytics worker, not in this callback
+            conversation = ai_handler.get_conversation_history(call_sid)
+            if conversation:
+                call_analytics.submit(call_sid, conversation)
+                # The worker keeps its own copy of the transcript
+                ai_handler.clear_conversation(call_sid)
         return '', 200
     except Exception as e:
         logger.exception("Error in status webhook")
@@ -182,6 +332,15 @@ def get_active_calls():
         logger.exception("Error in get_active_calls endpoint")
         return jsonify([])
 
+@app.route('/api/call-analytics', methods=['GET'])
+def get_call_analytics():
+    """Get summaries, intents and urgency flags for completed calls"""
+    try:
+        return jsonify(call_analytics.get_results())
+    except Exception as e:
+        logger.exception("Error in get_call_analytics endpoint")
+        return jsonify([])
+
 @app.route('/api/make-call', methods=['POST'])
 def make_call():
     """Initiate an outbound call"""
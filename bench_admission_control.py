@@ -0,0 +1,95 @@
+import argparse
+import logging
+import random
+import threading
+import time
+
+from admission_control import AdmissionController
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(load, capacity, service_time, duration, queue_timeout, in_progress_share, controlled, seed=0):
+    """Offer load x capacity requests per second against a backend with `capacity` slots"""
+    rng = random.Random(seed)
+    backend = threading.Semaphore(capacity)
+    controller = AdmissionController(
+        max_concurrent=capacity,
+        queue_timeout=queue_timeout,
+        max_queue=capacity * 50,
+        reserved_for_in_progress=max(1, capacity // 4),
+        caller_rate=0
+    )
+    results = []
+    results_lock = threading.Lock()
+
+    def handle(in_progress):
+        start = time.perf_counter()
+        admitted = True
+        if controlled:
+            admitted, _ = controller.acquire(in_progress=in_progress)
+        if admitted:
+            try:
+                with backend:
+                    time.sleep(service_time)
+            finally:
+                if controlled:
+                    controller.release()
+        with results_lock:
+            results.append((in_progress, admitted, time.perf_counter() - start))
+
+    rate = load * capacity / service_time
+    threads = []
+    start = time.perf_counter()
+    next_arrival = start
+    while next_arrival - start < duration:
+        time.sleep(max(0, next_arrival - time.perf_counter()))
+        thread = threading.Thread(target=handle, args=(rng.random() < in_progress_share,))
+        thread.start()
+        threads.append(thread)
+        next_arrival += rng.expovariate(rate)
+    for thread in threads:
+        thread.join()
+
+    latencies = [latency for _, _, latency in results]
+    served = [r for r in results if r[1]]
+    in_progress = [r for r in results if r[0]]
+    new_calls = [r for r in results if not r[0]]
+    return {
+        'requests': len(results),
+        'served_pct': 100 * len(served) / len(results),
+        'in_progress_served_pct': 100 * sum(1 for r in in_progress if r[1]) / max(len(in_progress), 1),
+        'new_served_pct': 100 * sum(1 for r in new_calls if r[1]) / max(len(new_calls), 1),
+        'p50': percentile(latencies, 50),
+        'p99': percentile(latencies, 99),
+        'served_p99': percentile([r[2] for r in served], 99),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Overload benchmark for voice webhook admission control")
+    parser.add_argument('--loads', type=float, nargs='+', default=[0.5, 1.0, 1.5, 2.0, 4.0],
+                        help="offered load as a multiple of backend capacity")
+    parser.add_argument('--capacity', type=int, default=4, help="concurrent requests the backend can serve")
+    parser.add_argument('--service-time', type=float, default=0.05, help="seconds per request (stands in for OpenAI)")
+    parser.add_argument('--duration', type=float, default=2.0, help="seconds of offered load per run")
+    parser.add_argument('--queue-timeout', type=float, default=0.25)
+    parser.add_argument('--in-progress-share', type=float, default=0.7, help="fraction of requests from calls already in progress")
+    args = parser.parse_args()
+    logging.getLogger('admission_control').setLevel(logging.ERROR)
+
+    print(f"{'mode':>10} {'load':>5} {'reqs':>5} {'served%':>8} {'ongoing%':>9} {'new%':>6} "
+          f"{'p50 ms':>7} {'p99 ms':>7} {'served p99':>10}")
+    for controlled in (False, True):
+        for load in args.loads:
+            r = run(load, args.capacity, args.service_time, args.duration, args.queue_timeout,
+                    args.in_progress_share, controlled)
+            print(f"{'admission' if controlled else 'none':>10} {load:>5.1f} {r['requests']:>5} "
+                  f"{r['served_pct']:>8.1f} {r['in_progress_served_pct']:>9.1f} {r['new_served_pct']:>6.1f} "
+                  f"{r['p50'] * 1000:>7.0f} {r['p99'] * 1000:>7.0f} {r['served_p99'] * 1000:>10.0f}")
@@ -0,0 +1,100 @@
+import argparse
+import json
+import logging
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+from call_analytics import CallAnalyticsWorker
+
+SAMPLE_UTTERANCES = [
+    "I'd like to book an appointment with Dr. Patel next week",
+    "Can I reschedule my appointment on Friday?",
+    "I have a question about my insurance coverage",
+    "What are your hours on Saturday?",
+    "I need a refill on my blood pressure medication",
+    "My son has had a fever since yesterday",
+    "My father has chest pain and can't breathe",
+    "Where is the clinic located and is there parking?",
+]
+
+
+class MockLLM:
+    """Mimics client.chat.completions.create with latency and token usage"""
+
+    def __init__(self, base_latency, per_call_latency):
+        self.base_latency = base_latency
+        self.per_call_latency = per_call_latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, **kwargs):
+        prompt = ' '.join(m['content'] for m in messages)
+        call_sids = re.findall(r'### Call (\S+)', prompt)
+        time.sleep(self.base_latency + self.per_call_latency * len(call_sids))
+        with self._lock:
+            self.requests += 1
+
+        content = json.dumps([{'call_sid': sid, 'summary': f"Summary of {sid}."} for sid in call_sids])
+        # Roughly four characters per token
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                                  total_tokens=prompt_tokens + completion_tokens)
+        )
+
+
+def make_conversation(rng, turns):
+    conversation = [{"role": "system", "content": "You are an AI-powered medical clinic receptionist."}]
+    for _ in range(turns):
+        conversation.append({"role": "user", "content": rng.choice(SAMPLE_UTTERANCES)})
+        conversation.append({"role": "assistant", "content": "Certainly, I can help you with that."})
+    return conversation
+
+
+def run(calls, batch_size, concurrency, flush_interval, base_latency, per_call_latency, seed=0):
+    rng = random.Random(seed)
+    llm = MockLLM(base_latency, per_call_latency)
+    worker = CallAnalyticsWorker(llm, batch_size=batch_size, flush_interval=flush_interval,
+                                 concurrency=concurrency)
+    conversations = [make_conversation(rng, rng.randint(2, 6)) for _ in range(calls)]
+
+    worker.start()
+    start = time.perf_counter()
+    for index, conversation in enumerate(conversations):
+        worker.submit(f"CA{index:032d}", conversation)
+    worker.flush()
+    elapsed = time.perf_counter() - start
+    worker.stop()
+
+    stats = worker.stats
+    return {
+        'calls_per_minute': stats['calls_analyzed'] / elapsed * 60,
+        'tokens_per_call': stats['tokens_used'] / max(stats['calls_analyzed'], 1),
+        'llm_requests': stats['llm_requests'],
+        'urgent': sum(1 for r in worker.get_results() if r['urgent']),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark batched post-call analytics against a mock LLM")
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 5, 10, 20])
+    parser.add_argument('--concurrency', type=int, default=2)
+    parser.add_argument('--flush-interval', type=float, default=0.05)
+    parser.add_argument('--base-latency', type=float, default=0.05, help="fixed seconds per LLM request")
+    parser.add_argument('--per-call-latency', type=float, default=0.005, help="extra seconds per call in a request")
+    args = parser.parse_args()
+    logging.getLogger('call_analytics').setLevel(logging.WARNING)
+
+    print(f"{'batch':>5} {'requests':>8} {'calls/min':>10} {'tokens/call':>11} {'urgent':>6}")
+    for batch_size in args.batch_sizes:
+        result = run(args.calls, batch_size, args.concurrency, args.flush_interval,
+                     args.base_latency, args.per_call_latency)
+        print(f"{batch_size:>5} {result['llm_requests']:>8} {result['calls_per_minute']:>10.0f} "
+              f"{result['tokens_per_call']:>11.1f} {result['urgent']:>6}")
@@ -0,0 +1,77 @@
+import argparse
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from webhook_dedup import TurnDeduplicator
+
+
+class FakeLLM:
+    """Stands in for AIHandler.process_speech with a fixed latency"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self.conversations = {}
+        self._lock = threading.Lock()
+
+    def process_speech(self, call_sid, speech_text):
+        with self._lock:
+            self.calls += 1
+        self.conversations.setdefault(call_sid, []).append(speech_text)
+        time.sleep(self.latency)
+        return f"<Response><Say>{speech_text}</Say></Response>"
+
+
+def run(calls, turns, duplicates, latency, dedup=True):
+    """Send every turn `duplicates` times concurrently and count LLM calls"""
+    llm = FakeLLM(latency)
+    deduplicator = TurnDeduplicator()
+
+    def webhook(call_sid, turn, speech):
+        if not dedup:
+            return llm.process_speech(call_sid, speech)
+        key = deduplicator.make_key(speech, turn)
+        return deduplicator.run(call_sid, key, lambda: (llm.process_speech(call_sid, speech), True))
+
+    def call_worker(call_index):
+        call_sid = f"CA{call_index:032d}"
+        with ThreadPoolExecutor(max_workers=duplicates) as pool:
+            for turn in range(1, turns + 1):
+                # Callers often give the same short answer to consecutive questions
+                speech = "yes"
+                futures = [pool.submit(webhook, call_sid, turn, speech) for _ in range(duplicates)]
+                results = {f.result() for f in futures}
+                assert len(results) == 1, "duplicates returned different TwiML"
+        return call_sid
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=calls) as pool:
+        list(pool.map(call_worker, range(calls)))
+    elapsed = time.perf_counter() - start
+
+    requests = calls * turns * duplicates
+    history_lengths = {len(h) for h in llm.conversations.values()}
+    return {
+        'requests': requests,
+        'llm_calls': llm.calls,
+        'history_lengths': sorted(history_lengths),
+        'elapsed': elapsed,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark duplicate speech webhook handling")
+    parser.add_argument('--calls', type=int, default=20)
+    parser.add_argument('--turns', type=int, default=5)
+    parser.add_argument('--duplicates', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.05)
+    args = parser.parse_args()
+    logging.getLogger('webhook_dedup').setLevel(logging.WARNING)
+
+    for dedup in (False, True):
+        stats = run(args.calls, args.turns, args.duplicates, args.latency, dedup=dedup)
+        label = "with dedup" if dedup else "without dedup"
+        print(f"{label:>14}: {stats['requests']} webhooks -> {stats['llm_calls']} LLM calls, "
+              f"turns per conversation {stats['history_lengths']}, {stats['elapsed']:.2f}s")
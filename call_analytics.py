@@ -0,0 +1,269 @@
+import json
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Keyword tables for the local classifiers, checked in order
+INTENT_KEYWORDS = [
+    ('emergency', ['emergency', '911', 'ambulance', 'chest pain', "can't breathe", 'cannot breathe', 'bleeding', 'unconscious', 'overdose', 'stroke']),
+    ('appointment', ['appointment', 'schedule', 'reschedule', 'book', 'cancel', 'booking', 'availability', 'available']),
+    ('billing', ['bill', 'billing', 'insurance', 'payment', 'pay', 'copay', 'invoice', 'charge', 'coverage']),
+    ('prescription', ['prescription', 'refill', 'medication', 'pharmacy', 'medicine']),
+    ('hours_location', ['hours', 'open', 'close', 'closed', 'address', 'location', 'directions', 'parking']),
+    ('medical_question', ['symptom', 'pain', 'fever', 'cough', 'rash', 'sick', 'hurt', 'doctor']),
+]
+
+HIGH_URGENCY_KEYWORDS = ['emergency', '911', 'ambulance', 'chest pain', "can't breathe", 'cannot breathe',
+                         'bleeding', 'unconscious', 'overdose', 'stroke', 'suicidal', 'seizure']
+MEDIUM_URGENCY_KEYWORDS = ['urgent', 'as soon as possible', 'asap', 'right away', 'severe',
+                           'fever', 'getting worse', 'vomiting']
+
+# A keyword preceded by one of these within NEGATION_WINDOW words of the same clause
+# doesn't count ("I don't have a fever"). High urgency keywords ignore negation, since
+# a false urgent flag is safer than a missed emergency.
+NEGATION_WORDS = {'no', 'not', 'never', 'without', 'none', "don't", "doesn't", "didn't",
+                  "isn't", "aren't", "wasn't", "haven't", "hasn't"}
+NEGATION_WINDOW = 3
+CLAUSE_BREAK = re.compile(r'[.,;?!]')
+
+ANALYTICS_PROMPT = """You summarize finished calls to a medical clinic receptionist.
+You will receive several call transcripts, each introduced by its call id.
+Reply with only a JSON array containing one object per call:
+[{"call_sid": "<call id>", "summary": "<one or two sentences on why the patient called and what was agreed>"}]"""
+
+
+def _caller_text(conversation):
+    return ' '.join(msg['content'] for msg in conversation if msg.get('role') == 'user').lower()
+
+
+def _contains(text, keyword, allow_negation=True):
+    for match in re.finditer(r'(?<!\w)' + re.escape(keyword) + r'(?!\w)', text):
+        if not allow_negation:
+            return True
+        clause = CLAUSE_BREAK.split(text[:match.start()])[-1]
+        preceding = re.findall(r"[\w']+", clause)[-NEGATION_WINDOW:]
+        if not NEGATION_WORDS.intersection(preceding):
+            return True
+    return False
+
+
+def classify_intent(conversation):
+    """Classify the caller's intent with keyword matching"""
+    text = _caller_text(conversation)
+    for intent, keywords in INTENT_KEYWORDS:
+        if any(_contains(text, keyword) for keyword in keywords):
+            return intent
+    return 'other'
+
+
+def classify_urgency(conversation):
+    """Rate a call as high, medium or low urgency with keyword matching"""
+    text = _caller_text(conversation)
+    if any(_contains(text, keyword, allow_negation=False) for keyword in HIGH_URGENCY_KEYWORDS):
+        return 'high'
+    if any(_contains(text, keyword) for keyword in MEDIUM_URGENCY_KEYWORDS):
+        return 'medium'
+    return 'low'
+
+
+def local_summary(conversation, max_length=200):
+    """Fallback summary built from the caller's first utterances"""
+    utterances = [msg['content'] for msg in conversation if msg.get('role') == 'user']
+    if not utterances:
+        return "Caller did not say anything."
+    summary = "Caller said: " + ' / '.join(utterances[:2])
+    if len(summary) > max_length:
+        summary = summary[:max_length - 3].rstrip() + '...'
+    return summary
+
+
+class CallAnalyticsWorker:
+    """Background worker that summarizes and classifies completed calls.
+
+    Completed calls are queued by the status webhook and analyzed off the
+    request path. Each worker thread groups up to batch_size calls, or
+    whatever arrived within flush_interval seconds, into one LLM request.
+    Intent and urgency come from the local keyword classifiers. Only the
+    most recent max_results analyses are kept.
+    """
+
+    def __init__(self, client, batch_size=5, flush_interval=10.0, concurrency=1,
+                 model="gpt-3.5-turbo", max_tokens_per_call=80, max_results=1000):
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+
+        self.client = client
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.concurrency = concurrency
+        self.model = model
+        self.max_tokens_per_call = max_tokens_per_call
+        self.max_results = max_results
+
+        self._queue = queue.Queue()
+        self._queued = set()
+        self._results = OrderedDict()
+        self._results_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._threads = []
+        self.stats = {'calls_analyzed': 0, 'llm_requests': 0, 'llm_failures': 0, 'tokens_used': 0}
+
+    def start(self):
+        """Start the worker threads"""
+        if self._threads:
+            return
+        self._stopped.clear()
+        for index in range(self.concurrency):
+            thread = threading.Thread(target=self._run, name=f"call-analytics-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Started {self.concurrency} call analytics worker(s)")
+
+    def stop(self, timeout=None):
+        """Stop the worker threads once the queue has drained"""
+        self._stopped.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, call_sid, conversation):
+        """Queue a finished call for analysis. Returns False if it was already queued or analyzed."""
+        with self._results_lock:
+            # Twilio can retry the completed status callback
+            if call_sid in self._queued or call_sid in self._results:
+                return False
+            self._queued.add(call_sid)
+
+        # Copy the transcript so later changes to the live conversation don't leak in
+        transcript = [dict(msg) for msg in conversation if msg.get('role') != 'system']
+        self._queue.put((call_sid, transcript))
+        return True
+
+    def flush(self):
+        """Block until every queued call has been analyzed"""
+        self._queue.join()
+
+    def get_result(self, call_sid):
+        """Get the analysis for a single call"""
+        with self._results_lock:
+            return self._results.get(call_sid)
+
+    def get_results(self):
+        """Get all analyses, newest first"""
+        with self._results_lock:
+            results = list(self._results.values())
+        return sorted(results, key=lambda r: r['analyzed_at'], reverse=True)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch:
+                try:
+                    self._analyze_batch(batch)
+                except Exception as e:
+                    logger.exception(f"Error analyzing call batch: {str(e)}")
+                finally:
+                    with self._results_lock:
+                        self._queued.difference_update(call_sid for call_sid, _ in batch)
+                    for _ in batch:
+                        self._queue.task_done()
+            elif self._stopped.is_set():
+                return
+
+    def _next_batch(self):
+        """Wait for the first call, then gather more until the batch is full or the flush interval ends"""
+        try:
+            first = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stopped.is_set():
+                # When stopping, take only what is already waiting
+                remaining = 0
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _analyze_batch(self, batch):
+        summaries = self._summarize(batch)
+        analyzed_at = datetime.utcnow().isoformat()
+
+        with self._results_lock:
+            for call_sid, transcript in batch:
+                urgency = classify_urgency(transcript)
+                self._results[call_sid] = {
+                    'call_sid': call_sid,
+                    'summary': summaries.get(call_sid) or local_summary(transcript),
+                    'intent': classify_intent(transcript),
+                    'urgency': urgency,
+                    'urgent': urgency == 'high',
+                    'turns': sum(1 for msg in transcript if msg.get('role') == 'user'),
+                    'analyzed_at': analyzed_at
+                }
+                self._results.move_to_end(call_sid)
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+            self.stats['calls_analyzed'] += len(batch)
+
+        logger.info(f"Analyzed {len(batch)} completed call(s)")
+
+    def _summarize(self, batch):
+        """Ask the LLM for summaries of every call in the batch with a single request"""
+        if self.client is None:
+            return {}
+
+        transcripts = []
+        for call_sid, transcript in batch:
+            lines = [f"{'Caller' if msg['role'] == 'user' else 'Receptionist'}: {msg['content']}" for msg in transcript]
+            transcripts.append(f"### Call {call_sid}\n" + '\n'.join(lines))
+
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": ANALYTICS_PROMPT},
+                    {"role": "user", "content": '\n\n'.join(transcripts)}
+                ],
+                max_tokens=self.max_tokens_per_call * len(batch),
+                temperature=0
+            )
+            usage = getattr(response, 'usage', None)
+            with self._results_lock:
+                self.stats['llm_requests'] += 1
+                self.stats['tokens_used'] += getattr(usage, 'total_tokens', 0) or 0
+
+            return self._parse_summaries(response.choices[0].message.content)
+        except Exception as e:
+            logger.error(f"LLM summary request failed, using local summaries: {str(e)}")
+            with self._results_lock:
+                self.stats['llm_failures'] += 1
+            return {}
+
+    def _parse_summaries(self, content):
+        # Tolerate prose or code fences around the JSON array
+        start = content.find('[')
+        end = content.rfind(']')
+        if start == -1 or end < start:
+            raise ValueError("No JSON array in LLM response")
+
+        summaries = {}
+        for item in json.loads(content[start:end + 1]):
+            if isinstance(item, dict) and item.get('call_sid') and item.get('summary'):
+                summaries[item['call_sid']] = str(item['summary']).strip()
+        return summaries
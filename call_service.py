@@ -62,8 +62,8 @@ class CallService:
             response = VoiceResponse()
             response.say("Hello, thank you for calling our medical clinic. How may I assist you today?", voice='alice')
             
-            # Create absolute URLs for webhooks
-            speech_url = f"{self.ngrok_url}/"
+            # Create absolute URLs for webhooks; Turn numbers the Gather for webhook dedup
+            speech_url = f"{self.ngrok_url}/?Turn=1"
             print(f" Speech webhook URL: {speech_url}")
             
             # Add gather for speech input
@@ -0,0 +1,51 @@
+import os
+import time
+
+import pytest
+
+# app.py builds its Twilio and OpenAI clients at import time; give them dummy credentials
+os.environ.setdefault('OPENAI_API_KEY', 'sk-test')
+os.environ.setdefault('TWILIO_ACCOUNT_SID', 'ACtest00000000000000000000000000')
+os.environ.setdefault('TWILIO_AUTH_TOKEN', 'test')
+os.environ.setdefault('TWILIO_PHONE_NUMBER', '+15550000000')
+os.environ.setdefault('NGROK_URL', 'https://example.ngrok.app')
+
+
+class StubAIHandler:
+    """Stands in for AIHandler with a fixed latency per turn"""
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.conversations = {}
+        self.calls = 0
+
+    def process_speech(self, call_sid, speech_text, raise_errors=False):
+        self.calls += 1
+        time.sleep(self.latency)
+        self.conversations.setdefault(call_sid, []).append({'role': 'user', 'content': speech_text})
+        return "Sure, what day works for you?"
+
+    def get_conversation_history(self, call_sid):
+        return self.conversations.get(call_sid, [])
+
+    def clear_conversation(self, call_sid):
+        self.conversations.pop(call_sid, None)
+        return True
+
+
+@pytest.fixture
+def voice_app(request, monkeypatch):
+    """The Flask app with a stub AI handler and fresh per-call state.
+
+    Parametrize indirectly to change the stub's latency in seconds.
+    """
+    import app as app_module
+    from admission_control import AdmissionController
+    from webhook_dedup import TurnDeduplicator
+
+    stub = StubAIHandler(latency=getattr(request, 'param', 0.05))
+    monkeypatch.setattr(app_module, 'ai_handler', stub)
+    monkeypatch.setattr(app_module, 'turn_deduplicator', TurnDeduplicator())
+    monkeypatch.setattr(app_module, 'admission_controller', AdmissionController())
+    monkeypatch.setattr(app_module, 'pending_utterances', {})
+    return app_module, stub
@@ -0,0 +1,187 @@
+import threading
+import time
+
+import pytest
+
+from admission_control import AdmissionController
+
+
+def test_in_progress_calls_use_reserved_slots():
+    controller = AdmissionController(max_concurrent=2, queue_timeout=0.05,
+                                     reserved_for_in_progress=1, caller_rate=0)
+
+    assert controller.acquire() == (True, None)
+    assert controller.acquire() == (False, 'queue_timeout')
+    assert controller.acquire(in_progress=True) == (True, None)
+
+
+def wait_until_queued(controller, count):
+    deadline = time.monotonic() + 5
+    while controller.snapshot()['queued'] < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_in_progress_request_is_admitted_before_earlier_new_call():
+    controller = AdmissionController(max_concurrent=1, queue_timeout=5,
+                                     reserved_for_in_progress=0, caller_rate=0)
+    assert controller.acquire() == (True, None)
+    admitted = []
+
+    def request(label, in_progress):
+        assert controller.acquire(in_progress=in_progress) == (True, None)
+        admitted.append(label)
+        time.sleep(0.02)
+        controller.release()
+
+    new_call = threading.Thread(target=request, args=('new', False))
+    new_call.start()
+    wait_until_queued(controller, 1)
+    ongoing_call = threading.Thread(target=request, args=('in-progress', True))
+    ongoing_call.start()
+    wait_until_queued(controller, 2)
+
+    controller.release()
+    new_call.join(5)
+    ongoing_call.join(5)
+
+    assert admitted == ['in-progress', 'new']
+
+
+def test_full_queue_is_shed_immediately():
+    controller = AdmissionController(max_concurrent=1, queue_timeout=5, max_queue=1,
+                                     reserved_for_in_progress=0, caller_rate=0)
+    assert controller.acquire() == (True, None)
+    waiter = threading.Thread(target=lambda: controller.acquire() and controller.release())
+    waiter.start()
+    wait_until_queued(controller, 1)
+
+    started = time.monotonic()
+    assert controller.acquire(in_progress=True) == (False, 'queue_full')
+    assert time.monotonic() - started < 1
+    assert controller.snapshot()['queue_full'] == 1
+
+    controller.release()
+    waiter.join(5)
+
+
+def test_caller_rate_limit():
+    controller = AdmissionController(caller_rate=1, caller_burst=2)
+
+    reasons = [controller.acquire('+15551234567')[1] for _ in range(3)]
+    assert reasons == [None, None, 'rate_limited']
+    assert controller.acquire('+15557654321') == (True, None)
+
+
+def shed_everything(app_module, monkeypatch):
+    controller = AdmissionController(caller_rate=0)
+    monkeypatch.setattr(controller, 'acquire', lambda **kwargs: (False, 'queue_timeout'))
+    monkeypatch.setattr(app_module, 'admission_controller', controller)
+
+
+def test_shed_speech_turn_keeps_utterance_out_of_redirect(voice_app, monkeypatch):
+    app_module, stub = voice_app
+    shed_everything(app_module, monkeypatch)
+    form = {'CallSid': 'CA1', 'From': '+15551234567', 'SpeechResult': 'My chest hurts'}
+
+    with app_module.app.test_client() as client:
+        body = client.post('/?Turn=3', data=form).get_data(as_text=True)
+
+    assert 'Please hold' in body
+    assert 'chest' not in body
+    assert 'Turn=3&amp;AdmissionRetry=1&amp;AdmissionPriority=in-progress' in body
+    assert app_module.pending_utterances['CA1'][:2] == (3, 'My chest hurts')
+
+    monkeypatch.setattr(app_module, 'admission_controller', AdmissionController(caller_rate=0))
+    retry_form = {'CallSid': 'CA1', 'From': '+15551234567'}
+    with app_module.app.test_client() as client:
+        body = client.post('/?Turn=3&AdmissionRetry=1&AdmissionPriority=in-progress',
+                           data=retry_form).get_data(as_text=True)
+
+    assert 'Sure, what day works for you?' in body
+    assert stub.conversations['CA1'] == [{'role': 'user', 'content': 'My chest hurts'}]
+    assert 'CA1' not in app_module.pending_utterances
+
+
+def test_shed_new_call_keeps_new_priority_on_retry(voice_app, monkeypatch):
+    app_module, _ = voice_app
+    controller = AdmissionController(caller_rate=0)
+    seen = []
+
+    def acquire(caller_id=None, in_progress=False):
+        seen.append(in_progress)
+        return False, 'queue_timeout'
+
+    monkeypatch.setattr(controller, 'acquire', acquire)
+    monkeypatch.setattr(app_module, 'admission_controller', controller)
+
+    with app_module.app.test_client() as client:
+        body = client.post('/', data={'CallSid': 'CA2'}).get_data(as_text=True)
+        assert 'AdmissionPriority=new' in body
+        client.post('/?Turn=0&AdmissionRetry=1&AdmissionPriority=new', data={'CallSid': 'CA2'})
+
+    assert seen == [False, False]
+
+
+def test_malformed_retry_counter_is_ignored(voice_app, monkeypatch):
+    app_module, _ = voice_app
+    monkeypatch.setattr(app_module, 'admission_controller', AdmissionController(caller_rate=0))
+
+    with app_module.app.test_client() as client:
+        body = client.post('/?AdmissionRetry=abc', data={'CallSid': 'CA3'}).get_data(as_text=True)
+
+    assert 'technical difficulties' not in body
+    assert '<Gather' in body
+
+
+def test_retries_past_limit_get_busy_message(voice_app, monkeypatch):
+    app_module, _ = voice_app
+    shed_everything(app_module, monkeypatch)
+    retry = app_module.ADMISSION_MAX_RETRIES
+
+    with app_module.app.test_client() as client:
+        body = client.post(f'/?AdmissionRetry={retry}', data={'CallSid': 'CA4'}).get_data(as_text=True)
+
+    assert '<Hangup' in body
+
+
+@pytest.mark.parametrize('voice_app', [0.1], indirect=True)
+def test_duplicate_webhooks_do_not_take_admission_slots(voice_app, monkeypatch):
+    app_module, stub = voice_app
+    controller = AdmissionController(max_concurrent=2, reserved_for_in_progress=1, caller_rate=0)
+    acquired = []
+    original_acquire = controller.acquire
+
+    def acquire(**kwargs):
+        acquired.append(kwargs)
+        return original_acquire(**kwargs)
+
+    monkeypatch.setattr(controller, 'acquire', acquire)
+    monkeypatch.setattr(app_module, 'admission_controller', controller)
+    form = {'CallSid': 'CA5', 'From': '+15551234567', 'SpeechResult': 'I need an appointment'}
+
+    def post():
+        with app_module.app.test_client() as client:
+            client.post('/?Turn=1', data=form)
+
+    threads = [threading.Thread(target=post) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert stub.calls == 1
+    assert len(acquired) == 1
+
+
+def test_stale_pending_utterances_are_swept(voice_app, monkeypatch):
+    app_module, _ = voice_app
+    shed_everything(app_module, monkeypatch)
+    stale = time.monotonic() - app_module.turn_deduplicator.ttl_seconds - 1
+    app_module.pending_utterances['CA_OLD'] = (1, 'Hello', stale)
+
+    with app_module.app.test_client() as client:
+        client.post('/?Turn=2', data={'CallSid': 'CA6', 'SpeechResult': 'Is 9am OK?'})
+
+    assert 'CA_OLD' not in app_module.pending_utterances
+    assert 'CA6' in app_module.pending_utterances
@@ -0,0 +1,162 @@
+import json
+import re
+from types import SimpleNamespace
+
+from call_analytics import CallAnalyticsWorker, classify_intent, classify_urgency, local_summary
+
+
+def caller(*utterances):
+    return [{'role': 'user', 'content': text} for text in utterances]
+
+
+def test_routine_questions_are_low_urgency():
+    assert classify_urgency(caller("Are you open today?")) == 'low'
+    assert classify_urgency(caller("I'd like to book a checkup, my back is in a bit of pain")) == 'low'
+
+
+def test_urgency_keywords():
+    assert classify_urgency(caller("My father has chest pain")) == 'high'
+    assert classify_urgency(caller("My son has a fever")) == 'medium'
+
+
+def test_negated_keywords_are_ignored():
+    assert classify_urgency(caller("I don't have a fever anymore")) == 'low'
+    assert classify_urgency(caller("It's not urgent, I just need a refill")) == 'low'
+    assert classify_intent(caller("It's not an emergency, I want to book an appointment")) == 'appointment'
+
+
+def test_negation_stops_at_clause_breaks():
+    assert classify_urgency(caller("No, I have a fever")) == 'medium'
+    assert classify_urgency(caller("Not sure; it's urgent")) == 'medium'
+
+
+def test_high_urgency_keywords_are_never_negated():
+    for sentence in [
+        "No, it's chest pain",
+        "Not really, he's unconscious",
+        "Not sure, chest pain I think",
+        "He never had a seizure before, now he is having one",
+        "No chest pain, just a follow up",
+    ]:
+        assert classify_urgency(caller(sentence)) == 'high', sentence
+
+
+def test_submit_skips_calls_already_queued_or_analyzed():
+    worker = CallAnalyticsWorker(None, flush_interval=0.01)
+    conversation = caller("I want to book an appointment")
+
+    assert worker.submit('CA1', conversation) is True
+    assert worker.submit('CA1', conversation) is False
+
+    worker.start()
+    worker.flush()
+    assert worker.submit('CA1', conversation) is False
+    worker.stop()
+
+    assert worker.stats['calls_analyzed'] == 1
+    assert worker.get_result('CA1')['intent'] == 'appointment'
+
+
+def test_results_are_capped():
+    worker = CallAnalyticsWorker(None, batch_size=10, flush_interval=0.01, max_results=3)
+    worker.start()
+    for index in range(5):
+        worker.submit(f'CA{index}', caller("What are your hours?"))
+    worker.flush()
+    worker.stop()
+
+    assert sorted(result['call_sid'] for result in worker.get_results()) == ['CA2', 'CA3', 'CA4']
+
+
+class StubLLM:
+    """Stands in for the OpenAI client; answers with a summary per call in the prompt"""
+
+    def __init__(self, content=None, error=None, skip=(), total_tokens=120):
+        self.content = content
+        self.error = error
+        self.skip = set(skip)
+        self.total_tokens = total_tokens
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, **kwargs):
+        self.requests.append(messages)
+        if self.error is not None:
+            raise self.error
+        call_sids = re.findall(r'### Call (\S+)', messages[-1]['content'])
+        content = self.content
+        if content is None:
+            content = json.dumps([{'call_sid': sid, 'summary': f"Summary of {sid}."}
+                                  for sid in call_sids if sid not in self.skip])
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(total_tokens=self.total_tokens)
+        )
+
+
+CONVERSATIONS = {
+    'CA1': caller("I want to book an appointment"),
+    'CA2': caller("What are your hours on Saturday?"),
+    'CA3': caller("I need a refill on my medication"),
+}
+
+
+def analyze(client):
+    worker = CallAnalyticsWorker(client, batch_size=3, flush_interval=0.5)
+    for call_sid, conversation in CONVERSATIONS.items():
+        worker.submit(call_sid, conversation)
+    worker.start()
+    worker.flush()
+    worker.stop()
+    return worker
+
+
+def test_batch_is_summarized_with_one_llm_request():
+    client = StubLLM()
+    worker = analyze(client)
+
+    assert len(client.requests) == 1
+    prompt = client.requests[0][-1]['content']
+    assert all(f"### Call {call_sid}" in prompt for call_sid in CONVERSATIONS)
+    for call_sid in CONVERSATIONS:
+        assert worker.get_result(call_sid)['summary'] == f"Summary of {call_sid}."
+    assert worker.stats == {'calls_analyzed': 3, 'llm_requests': 1, 'llm_failures': 0, 'tokens_used': 120}
+
+
+def test_summaries_wrapped_in_prose_are_parsed():
+    content = 'Here you go:\n```json\n[{"call_sid": "CA2", "summary": "Asked about hours."}]\n```'
+    worker = analyze(StubLLM(content=content))
+
+    assert worker.get_result('CA2')['summary'] == "Asked about hours."
+    assert worker.get_result('CA1')['summary'] == local_summary(CONVERSATIONS['CA1'])
+
+
+def test_call_missing_from_llm_response_gets_local_summary():
+    worker = analyze(StubLLM(skip={'CA3'}))
+
+    assert worker.get_result('CA1')['summary'] == "Summary of CA1."
+    assert worker.get_result('CA3')['summary'] == local_summary(CONVERSATIONS['CA3'])
+    assert worker.stats['llm_failures'] == 0
+
+
+def test_malformed_llm_response_falls_back_to_local_summaries():
+    worker = analyze(StubLLM(content='[{"call_sid": "CA1", "summary": '))
+
+    for call_sid, conversation in CONVERSATIONS.items():
+        assert worker.get_result(call_sid)['summary'] == local_summary(conversation)
+    # The request went through, so its tokens count, but the batch is recorded as a failure
+    assert worker.stats['llm_requests'] == 1
+    assert worker.stats['llm_failures'] == 1
+    assert worker.stats['tokens_used'] == 120
+
+
+def test_llm_error_falls_back_to_local_summaries():
+    client = StubLLM(error=RuntimeError("OpenAI is down"))
+    worker = analyze(client)
+
+    assert len(client.requests) == 1
+    for call_sid, conversation in CONVERSATIONS.items():
+        result = worker.get_result(call_sid)
+        assert result['summary'] == local_summary(conversation)
+    assert worker.get_result('CA3')['intent'] == 'prescription'
+    assert worker.stats == {'calls_analyzed': 3, 'llm_requests': 0, 'llm_failures': 1, 'tokens_used': 0}
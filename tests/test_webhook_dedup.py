@@ -0,0 +1,208 @@
+import threading
+import time
+
+import pytest
+
+from webhook_dedup import TurnDeduplicator
+
+
+class CountingHandler:
+    """Handler that records calls and can block until released"""
+
+    def __init__(self, result='resp', cacheable=True, gate=None):
+        self.result = result
+        self.cacheable = cacheable
+        self.gate = gate
+        self.calls = 0
+        self.started = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        return f"{self.result}{self.calls}", self.cacheable
+
+
+def test_concurrent_duplicate_waits_for_in_flight_result():
+    dedup = TurnDeduplicator()
+    gate = threading.Event()
+    handler = CountingHandler(gate=gate)
+    key = dedup.make_key('I need an appointment', turn=1)
+    results = []
+
+    first = threading.Thread(target=lambda: results.append(dedup.run('CA1', key, handler)))
+    first.start()
+    assert handler.started.wait(5)
+    second = threading.Thread(target=lambda: results.append(dedup.run('CA1', key, handler)))
+    second.start()
+
+    time.sleep(0.05)
+    assert results == []
+    gate.set()
+    first.join(5)
+    second.join(5)
+
+    assert results == ['resp1', 'resp1']
+    assert handler.calls == 1
+
+
+def test_finished_duplicate_gets_cached_result():
+    dedup = TurnDeduplicator()
+    handler = CountingHandler()
+    key = dedup.make_key('I need an appointment', turn=1)
+
+    assert dedup.run('CA1', key, handler) == 'resp1'
+    assert dedup.run('CA1', key, handler) == 'resp1'
+    assert handler.calls == 1
+
+
+def test_cached_result_expires_after_ttl():
+    dedup = TurnDeduplicator(ttl_seconds=0.01)
+    handler = CountingHandler()
+    key = dedup.make_key('I need an appointment', turn=1)
+
+    assert dedup.run('CA1', key, handler) == 'resp1'
+    time.sleep(0.05)
+    assert dedup.run('CA1', key, handler) == 'resp2'
+
+
+def test_handler_error_is_not_cached():
+    dedup = TurnDeduplicator()
+    key = dedup.make_key('I need an appointment', turn=1)
+
+    def failing():
+        raise RuntimeError("OpenAI is down")
+
+    with pytest.raises(RuntimeError):
+        dedup.run('CA1', key, failing)
+    assert dedup.run('CA1', key, CountingHandler()) == 'resp1'
+
+
+def test_uncacheable_result_is_recomputed_on_retry():
+    dedup = TurnDeduplicator()
+    handler = CountingHandler(result='apology', cacheable=False)
+    key = dedup.make_key('I need an appointment', turn=1)
+
+    assert dedup.run('CA1', key, handler) == 'apology1'
+    assert dedup.run('CA1', key, handler) == 'apology2'
+
+
+def test_repeated_utterance_on_next_turn_is_a_new_turn():
+    dedup = TurnDeduplicator()
+    handler = CountingHandler()
+
+    assert dedup.run('CA1', dedup.make_key('Yes.', turn=1), handler) == 'resp1'
+    assert dedup.run('CA1', dedup.make_key('Yes.', turn=2), handler) == 'resp2'
+    assert handler.calls == 2
+
+
+def test_late_retry_of_earlier_turn_is_still_deduplicated():
+    dedup = TurnDeduplicator()
+    handler = CountingHandler()
+
+    dedup.run('CA1', dedup.make_key('Book me in', turn=1), handler)
+    dedup.run('CA1', dedup.make_key('Tuesday', turn=2), handler)
+    assert dedup.run('CA1', dedup.make_key('Book me in', turn=1), handler) == 'resp1'
+    assert handler.calls == 2
+
+
+def test_make_key_falls_back_to_speech_hash():
+    dedup = TurnDeduplicator()
+    assert dedup.make_key('Yes  please', turn=3) == 'turn:3'
+    assert dedup.make_key('Yes  please') == dedup.make_key('yes please')
+
+
+def test_duplicate_stops_waiting_after_timeout():
+    dedup = TurnDeduplicator(wait_timeout=0.05)
+    gate = threading.Event()
+    handler = CountingHandler(gate=gate)
+    key = dedup.make_key('I need an appointment', turn=1)
+
+    owner = threading.Thread(target=lambda: dedup.run('CA1', key, handler))
+    owner.start()
+    assert handler.started.wait(5)
+
+    started = time.monotonic()
+    assert dedup.run('CA1', key, handler, on_timeout=lambda: 'hold') == 'hold'
+    assert time.monotonic() - started < 1
+    with pytest.raises(TimeoutError):
+        dedup.run('CA1', key, handler)
+
+    gate.set()
+    owner.join(5)
+    assert handler.calls == 1
+
+
+def test_next_turn_stops_waiting_for_stuck_previous_turn():
+    dedup = TurnDeduplicator(wait_timeout=0.05)
+    gate = threading.Event()
+    stuck = CountingHandler(gate=gate)
+    owner = threading.Thread(target=lambda: dedup.run('CA1', dedup.make_key('Book me in', turn=1), stuck))
+    owner.start()
+    assert stuck.started.wait(5)
+
+    handler = CountingHandler()
+    key = dedup.make_key('Tuesday', turn=2)
+    assert dedup.run('CA1', key, handler, on_timeout=lambda: 'hold') == 'hold'
+    assert handler.calls == 0
+
+    gate.set()
+    owner.join(5)
+    # The held turn was not cached, so its retry runs normally
+    assert dedup.run('CA1', key, handler) == 'resp1'
+
+
+def test_expired_calls_are_swept():
+    dedup = TurnDeduplicator(ttl_seconds=0.01)
+    dedup.run('CA1', dedup.make_key('Hello', turn=1), CountingHandler())
+    time.sleep(0.05)
+    dedup.run('CA2', dedup.make_key('Hello', turn=1), CountingHandler())
+
+    assert 'CA1' not in dedup._turns
+    assert 'CA1' not in dedup._call_locks
+    assert 'CA2' in dedup._turns
+
+
+def test_root_route_processes_duplicate_webhooks_once(voice_app):
+    app_module, stub = voice_app
+    form = {'CallSid': 'CA1', 'From': '+15551234567', 'SpeechResult': 'I need an appointment'}
+    responses = []
+
+    def post():
+        with app_module.app.test_client() as client:
+            responses.append(client.post('/?Turn=1', data=form).get_data(as_text=True))
+
+    threads = [threading.Thread(target=post) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    post()
+
+    assert stub.calls == 1
+    assert stub.conversations['CA1'] == [{'role': 'user', 'content': 'I need an appointment'}]
+    assert len(set(responses)) == 1 and len(responses) == 4
+    assert 'Sure, what day works for you?' in responses[0]
+    assert 'Turn=2' in responses[0]
+
+
+def test_root_route_does_not_replay_ai_failure(voice_app):
+    app_module, stub = voice_app
+    form = {'CallSid': 'CA1', 'From': '+15551234567', 'SpeechResult': 'I need an appointment'}
+    process_speech = stub.process_speech
+
+    def flaky(call_sid, speech_text, raise_errors=False):
+        if stub.calls == 0:
+            stub.calls += 1
+            raise RuntimeError("OpenAI is down")
+        return process_speech(call_sid, speech_text, raise_errors)
+
+    stub.process_speech = flaky
+    with app_module.app.test_client() as client:
+        first = client.post('/?Turn=1', data=form).get_data(as_text=True)
+        second = client.post('/?Turn=1', data=form).get_data(as_text=True)
+
+    assert 'I apologize for the difficulty' in first
+    assert 'Sure, what day works for you?' in second
+    assert stub.calls == 2
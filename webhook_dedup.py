@@ -0,0 +1,149 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+class _Turn:
+    """A single speech turn for a call, either in flight or finished"""
+
+    def __init__(self, key):
+        self.key = key
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.finished_at = None
+
+
+class TurnDeduplicator:
+    """Serialize speech webhooks per call and replay duplicate turns.
+
+    Twilio retries webhooks on timeout and the Gather is followed by a
+    Redirect to the same URL, so one utterance can reach us more than once.
+    A duplicate of a running turn waits for its result, and a duplicate of a
+    finished turn gets the cached TwiML instead of another OpenAI call.
+
+    The handler returns (result, cacheable). Results that are not cacheable,
+    such as an apology after an OpenAI failure, are handed to duplicates
+    already waiting but not replayed to later requests.
+
+    Waiting for another request's turn, or for the previous turn of the same
+    call, is bounded by wait_timeout so it stays below Twilio's 15 second
+    webhook timeout. When it runs out, on_timeout() is returned instead.
+    Calls whose newest turn is older than the TTL are swept periodically,
+    since inbound calls never send the completed status callback.
+    """
+
+    def __init__(self, ttl_seconds=30.0, max_turns_per_call=8, wait_timeout=10.0):
+        self.ttl_seconds = ttl_seconds
+        self.max_turns_per_call = max_turns_per_call
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._call_locks = {}
+        self._turns = {}
+        self._last_sweep = time.monotonic()
+
+    def make_key(self, speech_result, turn=None):
+        """Build the idempotency key for a turn within a call.
+
+        The turn number comes from the Gather action URL, so retries of the
+        same Gather share it while a repeated answer to the next question
+        does not. The speech hash is only a fallback when it is missing.
+        """
+        if turn:
+            return f"turn:{turn}"
+        normalized = ' '.join(speech_result.lower().split())
+        return "speech:" + hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+    def run(self, call_sid, turn_key, handler, on_timeout=None):
+        """Run handler once per (call_sid, turn_key) and return its result"""
+        deadline = time.monotonic() + self.wait_timeout
+        with self._lock:
+            self._sweep()
+            turns = self._turns.setdefault(call_sid, OrderedDict())
+            turn = turns.get(turn_key)
+            if turn is not None and not self._expired(turn):
+                owner = False
+            else:
+                turn = _Turn(turn_key)
+                turns[turn_key] = turn
+                turns.move_to_end(turn_key)
+                # Keep a few recent turns so a late retry of an earlier turn still matches
+                while len(turns) > self.max_turns_per_call:
+                    turns.popitem(last=False)
+                owner = True
+            call_lock = self._call_locks.setdefault(call_sid, threading.Lock())
+
+        if not owner:
+            logger.info(f"Duplicate webhook for call {call_sid}, waiting for turn {turn_key[:16]}")
+            if not turn.done.wait(self.wait_timeout):
+                logger.warning(f"Timed out waiting for turn {turn_key[:16]} of call {call_sid}")
+                return self._timeout_result(on_timeout)
+            if turn.error is not None:
+                raise turn.error
+            return turn.result
+
+        cacheable = False
+        try:
+            if call_lock.acquire(timeout=max(0, deadline - time.monotonic())):
+                try:
+                    turn.result, cacheable = handler()
+                finally:
+                    call_lock.release()
+            else:
+                # The previous turn of this call is still running; don't queue behind it
+                logger.warning(f"Timed out waiting for the previous turn of call {call_sid}")
+                turn.result = self._timeout_result(on_timeout)
+        except Exception as e:
+            turn.error = e
+            raise
+        finally:
+            turn.finished_at = time.monotonic()
+            if not cacheable:
+                # Let a later retry recompute the turn instead of replaying the failure
+                self._discard(call_sid, turn)
+            turn.done.set()
+
+        return turn.result
+
+    def forget(self, call_sid):
+        """Drop cached turns and the lock for a finished call"""
+        with self._lock:
+            self._turns.pop(call_sid, None)
+            self._call_locks.pop(call_sid, None)
+
+    def _timeout_result(self, on_timeout):
+        if on_timeout is None:
+            raise TimeoutError("Timed out waiting for an in-flight turn")
+        return on_timeout()
+
+    def _sweep(self):
+        """Drop calls whose newest turn expired; the caller holds self._lock"""
+        now = time.monotonic()
+        if now - self._last_sweep < self.ttl_seconds:
+            return
+        self._last_sweep = now
+
+        for call_sid, turns in list(self._turns.items()):
+            newest = next(reversed(turns), None)
+            if newest is None or self._expired(turns[newest]):
+                del self._turns[call_sid]
+                call_lock = self._call_locks.get(call_sid)
+                if call_lock is not None and not call_lock.locked():
+                    del self._call_locks[call_sid]
+
+    def _discard(self, call_sid, turn):
+        with self._lock:
+            turns = self._turns.get(call_sid)
+            if turns is not None and turns.get(turn.key) is turn:
+                del turns[turn.key]
+
+    def _expired(self, turn):
+        if turn.finished_at is None:
+            return False
+        return time.monotonic() - turn.finished_at > self.ttl_seconds